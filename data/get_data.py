@@ -1,48 +1,20 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
 import json
+import os
+from pathlib import Path
 import requests
-from time import sleep
-from typing import Any, Dict, List
+from requests.adapters import HTTPAdapter
+from threading import Event, Lock
+from time import monotonic, sleep
+from typing import Any, Dict, List, Optional, Tuple
 
 import networkx as nx
 import pandas as pd
 from tqdm import tqdm
 
 
-def get_esco_data(uri: str, endpoint: str) -> dict:
-    """
-    Fetches ESCO data from a specified API endpoint.
-
-    Args:
-        uri (str): The URI for the resource.
-        endpoint (str): The API endpoint to fetch data from.
-
-    Returns:
-        dict: The JSON response as a dictionary.
-    """
-    params = {
-        "uri": uri, 
-        "language": "en",  # Desired reference language
-        "selectedVersion": "v1.2.0"  # Optional, defaults to latest
-    }
-
-    # Define headers
-    headers = {
-        "Accept": "application/json,application/json;charset=UTF-8",
-        "Content-Type": "application/json"
-    }
-
-    url = f"https://ec.europa.eu/esco/api/resource/{endpoint}"
-
-    # Make the GET request
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()  # Raise an error for bad status codes
-        return response.json()
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Exception when calling the API: {e} for {uri}\n")
-        return 'error'
-    
 class Vividict(dict):
     """
     A subclass of dict that returns another instance of itself when accessing
@@ -68,13 +40,294 @@ class Vividict(dict):
         return value
 
 
-def makde_dict(raw_data: Dict[str, Any], dict_type: type) -> Vividict:
+API_URL = "https://ec.europa.eu/esco/api/resource"
+ESCO_VERSION = "v1.2.0"
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket, limiting the rate of requests shared across worker threads.
+
+    Example:
+        bucket = TokenBucket(rate=4, capacity=4)
+        bucket.acquire()  # Blocks until a token is available.
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        """
+        Args:
+            rate (float): Tokens added per second.
+            capacity (int): Maximum number of tokens, i.e. the allowed burst size.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = monotonic()
+        self.lock = Lock()
+        self.closed = Event()
+
+    def close(self) -> None:
+        """
+        Stop handing out tokens, so waiting workers give up instead of making more requests.
+        """
+        self.closed.set()
+
+    def acquire(self) -> None:
+        """
+        Take a single token, waiting until one is available.
+
+        Raises:
+            RuntimeError: If the bucket was closed.
+        """
+        while True:
+            if self.closed.is_set():
+                raise RuntimeError("Rate limiter is closed")
+            with self.lock:
+                now = monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.closed.wait(wait)
+
+
+class ResponseCache:
+    """
+    An on-disk cache of API responses, one JSON file per (endpoint, uri) pair.
+
+    Each entry stores the response body along with its ETag and Last-Modified headers,
+    so that cached entries can be revalidated with a conditional request.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def _entry_path(self, uri: str, endpoint: str) -> Path:
+        key = hashlib.sha1(f"{endpoint}|{ESCO_VERSION}|{uri}".encode("utf-8")).hexdigest()
+        return self.path / f"{key}.json"
+
+    def get(self, uri: str, endpoint: str) -> Optional[Dict[str, Any]]:
+        path = self._entry_path(uri, endpoint)
+        if not path.exists():
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def put(self, uri: str, endpoint: str, entry: Dict[str, Any]) -> None:
+        # write to a temporary file first, so an interrupted run never leaves a truncated entry
+        path = self._entry_path(uri, endpoint)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+
+def make_session(pool_size: int) -> requests.Session:
+    """
+    Creates a requests session with a connection pool large enough for all worker threads.
+
+    Args:
+        pool_size (int): The number of concurrent connections to keep open.
+
+    Returns:
+        requests.Session: The session to share across workers.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "Accept": "application/json,application/json;charset=UTF-8",
+        "Content-Type": "application/json"
+    })
+    return session
+
+
+def get_retry_delay(response: Optional[requests.Response], attempt: int, backoff: float) -> float:
+    """
+    Gets the delay before retrying a failed request.
+
+    The server's Retry-After header (in seconds) is respected when given, otherwise
+    the delay grows exponentially with the number of attempts.
+
+    Args:
+        response (requests.Response): The failed response, None if there was no response.
+        attempt (int): The number of the failed attempt, starting at 0.
+        backoff (float): Base delay in seconds.
+
+    Returns:
+        float: The delay in seconds.
+    """
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after is not None and retry_after.strip().isdigit():
+        return float(retry_after)
+    return backoff * 2 ** attempt
+
+
+def get_esco_data(
+    uri: str,
+    endpoint: str,
+    session: Optional[requests.Session] = None,
+    base_url: str = API_URL,
+    rate_limiter: Optional[TokenBucket] = None,
+    cache: Optional[ResponseCache] = None,
+    refresh: bool = False,
+    max_retries: int = 3,
+    backoff: float = 1.0,
+) -> dict:
+    """
+    Fetches ESCO data from a specified API endpoint.
+
+    Cached responses are returned without a request, unless `refresh` is set, in which case
+    they are revalidated and only re-downloaded if they changed. Failed requests are retried
+    with exponential backoff.
+
+    Args:
+        uri (str): The URI for the resource.
+        endpoint (str): The API endpoint to fetch data from.
+        session (requests.Session): Session to reuse connections from.
+        base_url (str): The API base URL, i.e. a local server replaying recorded responses.
+        rate_limiter (TokenBucket): Rate limiter shared across workers.
+        cache (ResponseCache): On-disk response cache.
+        refresh (bool): Revalidate cached responses against the API.
+        max_retries (int): Number of retries after the first failed attempt.
+        backoff (float): Base delay in seconds, doubled after every failed attempt.
+
+    Returns:
+        dict: The JSON response as a dictionary.
+    """
+    cached = cache.get(uri, endpoint) if cache is not None else None
+    if cached is not None and not refresh:
+        return cached["data"]
+
+    params = {
+        "uri": uri, 
+        "language": "en",  # Desired reference language
+        "selectedVersion": ESCO_VERSION  # Optional, defaults to latest
+    }
+
+    # Conditional request headers, so unchanged resources aren't downloaded again
+    headers = {}
+    if cached is not None:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    url = f"{base_url}/{endpoint}"
+    session = session or make_session(1)
+
+    for attempt in range(max_retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+
+        try:
+            response = session.get(url, headers=headers, params=params, timeout=30)
+            if response.status_code == 304 and cached is not None:
+                return cached["data"]
+            response.raise_for_status()  # Raise an error for bad status codes
+            data = response.json()
+            if cache is not None:
+                cache.put(uri, endpoint, {
+                    "data": data,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                })
+            return data
+
+        except requests.exceptions.RequestException as e:
+            # client errors other than rate limiting won't succeed on retry
+            status = e.response.status_code if e.response is not None else None
+            if attempt == max_retries or (status is not None and status < 500 and status != 429):
+                print(f"Exception when calling the API: {e} for {uri}\n")
+                return 'error'
+            sleep(get_retry_delay(e.response, attempt, backoff))
+
+
+def scrape(
+    to_scrape: List[Tuple[str, str]],
+    output_path: str,
+    base_url: str = API_URL,
+    cache_dir: Optional[str] = None,
+    workers: int = 8,
+    rate: float = 4.0,
+    refresh: bool = False,
+    backoff: float = 1.0,
+) -> Tuple[Dict[str, Vividict], List[str]]:
+    """
+    Scrapes the given (code, uri) pairs concurrently.
+
+    Each processed occupation is appended to `output_path` as a JSON line as soon as it
+    arrives, so progress is visible and kept even if the run is interrupted. Combined with
+    the response cache, rerunning only fetches the URIs that are missing.
+
+    Args:
+        to_scrape (List[Tuple[str, str]]): The (code, uri) pairs to scrape.
+        output_path (str): Path of the incremental JSON lines output.
+        base_url (str): The API base URL.
+        cache_dir (str): Directory of the on-disk response cache, no caching if None.
+        workers (int): Number of concurrent worker threads.
+        rate (float): Maximum requests per second across all workers.
+        refresh (bool): Revalidate cached responses against the API.
+        backoff (float): Base delay in seconds between retries.
+
+    Returns:
+        Tuple[Dict[str, Vividict], List[str]]: The processed occupations by code, and the codes that failed.
+    """
+    session = make_session(workers)
+    rate_limiter = TokenBucket(rate=rate, capacity=max(1, int(rate)))
+    cache = ResponseCache(cache_dir) if cache_dir else None
+
+    errors = []             # List to keep track of scraping errors
+    occupation_dict = {}    # Dictionary to store processed occupation data
+
+    with ThreadPoolExecutor(max_workers=workers) as executor, open(output_path, 'w') as f:
+        futures = {
+            executor.submit(
+                get_esco_data, uri, 'occupation',
+                session=session,
+                base_url=base_url,
+                rate_limiter=rate_limiter,
+                cache=cache,
+                refresh=refresh,
+                backoff=backoff,
+            ): code
+            for code, uri in to_scrape
+        }
+        try:
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                code = futures[future]
+                data = future.result()
+                if data != 'error':
+                    occupation_dict[code] = makde_dict(data, code, 'occupations')
+                    f.write(json.dumps({code: occupation_dict[code]}) + '\n')
+                    f.flush()
+                else:
+                    errors.append(code)
+        except BaseException:
+            # i.e. Ctrl-C: drop the queued URIs rather than fetching all of them on exit,
+            # whatever was already fetched is in the cache for the next run
+            rate_limiter.close()
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    # keep the output ordered by code, as the sequential scraper did
+    occupation_dict = {code: occupation_dict[code] for code in sorted(occupation_dict)}
+
+    return (occupation_dict, sorted(errors))
+
+
+def makde_dict(raw_data: Dict[str, Any], code: str, dict_type: type) -> Vividict:
     """
     Processes raw data into a custom Vividict structure.
 
     Args:
         raw_data (dict): The raw data containing fields such as 'title', 'uri', 
                          and optionally 'description'.
+        code (str): The ISCO/ESCO code of the occupation.
         dict_type (type): The type of dictionary to use (e.g., Vividict).
 
     Returns:
@@ -143,8 +396,18 @@ def get_parent(ancestors: str) -> str:
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--esco-path", type=str, required=False, default="./ESCO_dataset", help="Path to the downloaded ESCO dataset directory")
+    parser.add_argument("--output", type=str, required=False, default="../data", help="Output directory")
+    parser.add_argument("--cache", type=str, required=False, default="./esco_cache", help="Directory of the on-disk API response cache")
+    parser.add_argument("--base-url", type=str, required=False, default=API_URL, help="ESCO API base URL, i.e. a local server replaying recorded responses")
+    parser.add_argument("--workers", type=int, required=False, default=8, help="Number of concurrent requests")
+    parser.add_argument("--rate", type=float, required=False, default=4.0, help="Maximum requests per second")
+    parser.add_argument("--refresh", action="store_true", help="Revalidate cached responses against the API")
+    args = parser.parse_args()
+
     # Define the path to the ESCO dataset directory
-    ESCO_PATH = './ESCO_dataset'
+    ESCO_PATH = args.esco_path
 
     # Load ISCO group data (codes and URIs) from the CSV file
     df_isco = pd.read_csv(f'{ESCO_PATH}/ISCOGroups_en.csv', dtype={'code': str})
@@ -161,17 +424,16 @@ if __name__ == '__main__':
     # Combine ISCO and ESCO data and sort the list
     to_scrape = sorted(isco_data + esco_data)
 
-    errors = []             # List to keep track of scraping errors
-    occupation_dict = {}    # Dictionary to store processed occupation data
-
     # Scrape data from the ESCO API
-    for code, uri in tqdm(to_scrape):
-        data = get_esco_data(uri, 'occupation') 
-        if data != 'error':                       
-            occupation_dict[code] = makde_dict(data, 'occupations')  
-        else:
-            errors.append(code)
-        sleep(.25)
+    occupation_dict, errors = scrape(
+        to_scrape,
+        output_path=f'{args.output}/occupations_data.jsonl',
+        base_url=args.base_url,
+        cache_dir=args.cache,
+        workers=args.workers,
+        rate=args.rate,
+        refresh=args.refresh,
+    )
 
     # Build a directed graph to track parent-child relationships among nodes (occupations)
     G = nx.DiGraph()
@@ -187,9 +449,9 @@ if __name__ == '__main__':
         occupation_dict[id]['is_leaf'] = G.out_degree(id) == 0
 
     # Write the processed occupation data to a JSON file
-    with open(f'../data/occupations_data.json', 'w') as f:
+    with open(f'{args.output}/occupations_data.json', 'w') as f:
         json.dump(occupation_dict, f, indent=4)
     
     # Write any errors to a separate JSON file
-    with open('../data/errors.json', 'w') as f:
+    with open(f'{args.output}/errors.json', 'w') as f:
         json.dump(errors, f, indent=4)
\ No newline at end of file
@@ -0,0 +1,212 @@
+import argparse
+import hashlib
+import json
+from pathlib import Path
+import pickle
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from data import load_occupations
+
+CATALOG_VERSION = 3
+MANIFEST_FILE = "manifest.json"
+ESCO_CODES_FILE = "esco_codes.npy"
+ESCO_TO_ISCO_FILE = "esco_to_isco.npy"
+TEXT_OFFSETS_FILE = "text_offsets.npy"
+TEXT_FILE = "text.bin"
+EMBEDDINGS_FILE = "embeddings.npy"
+
+def file_checksum(path: str) -> str:
+    """
+    Compute the SHA-256 checksum of the given file.
+
+    Args:
+        path (str): The file to hash.
+
+    Returns:
+        str: The hex digest of the file contents.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_fingerprint(path: str) -> Dict[str, Any]:
+    """
+    Get a cheap fingerprint of the given file, checked before falling back to the full checksum.
+
+    Args:
+        path (str): The file to fingerprint.
+
+    Returns:
+        Dict[str, Any]: The file size and modification time.
+    """
+    stat = Path(path).stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def get_occupation_text(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract the text fields used in the LLM rerank prompt from a single occupation entry.
+
+    Args:
+        data (Dict[str, Any]): The occupation entry from the occupations JSON file.
+
+    Returns:
+        Dict[str, Any]: The title, alternative labels, description and skills.
+    """
+    en = data.get("languages", {}).get("en", {})
+    return {
+        "title": data.get("title", ""),
+        "alternative_labels": en.get("alternativeLabel", []),
+        "description": data.get("description", ""),
+        "skills": data.get("hasEssentialSkill", []) + data.get("hasOptionalSkill", []),
+    }
+
+def compile_catalog(occupations_path: str, embeddings_path: str, output_dir: str) -> None:
+    """
+    Compile the occupations JSON file into a compact binary catalog.
+
+    The catalog rows follow the same order as `load_occupations`, which is the row order
+    of the occupations embedding matrix, and the row index is the integer ESCO id. ISCO
+    codes are 4 digits, so they are stored as integers, i.e. 110 for 0110. Hierarchical
+    ESCO codes like 2422.12.4 don't map to integers, and are kept in a fixed-width
+    byte string array indexed by ESCO id. The embedding matrix is copied into the catalog,
+    and the checksum of the embeddings file is stored so the catalog can be verified
+    against it.
+
+    Args:
+        occupations_path (str): Path to the occupations JSON file.
+        embeddings_path (str): Path to the occupations embeddings pickle.
+        output_dir (str): Directory to write the catalog to.
+    """
+    esco_codes, isco_codes, occupation_dict = load_occupations(occupations_path)
+
+    with open(embeddings_path, "rb") as f:
+        embeddings = np.asarray(pickle.load(f), dtype=np.float32)
+    assert len(embeddings) == len(esco_codes), (
+        f"Embeddings have {len(embeddings)} rows but the occupations file has {len(esco_codes)} entries"
+    )
+
+    assert isco_codes.str.fullmatch(r"\d{4}").all(), "ISCO codes are expected to have 4 digits"
+    esco_to_isco = isco_codes.astype(int).to_numpy()
+
+    # text fields are stored as one UTF-8 JSON record per row, addressed by byte offsets
+    text_offsets = [0]
+    text_records = []
+    for esco_code in esco_codes:
+        record = json.dumps(get_occupation_text(occupation_dict[esco_code])).encode("utf-8")
+        text_records.append(record)
+        text_offsets.append(text_offsets[-1] + len(record))
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    np.save(output_path / ESCO_CODES_FILE, esco_codes.to_numpy(dtype=str).astype(np.bytes_))
+    np.save(output_path / ESCO_TO_ISCO_FILE, esco_to_isco.astype(np.int16))
+    np.save(output_path / TEXT_OFFSETS_FILE, np.asarray(text_offsets, dtype=np.int64))
+    np.save(output_path / EMBEDDINGS_FILE, embeddings)
+    with open(output_path / TEXT_FILE, "wb") as f:
+        f.write(b"".join(text_records))
+
+    with open(output_path / MANIFEST_FILE, "w") as f:
+        json.dump({
+            "version": CATALOG_VERSION,
+            "n_occupations": len(esco_codes),
+            "embeddings_sha256": file_checksum(embeddings_path),
+            "embeddings_fingerprint": file_fingerprint(embeddings_path),
+        }, f, indent=4)
+
+class OccupationCatalog:
+    """
+    A memory-mapped view of a compiled occupations catalog.
+
+    Row `i` of the catalog corresponds to row `i` of the occupations embedding matrix,
+    which is available memory-mapped as `catalog.embeddings`.
+
+    Example:
+        catalog = OccupationCatalog("catalog/", embeddings_path="embeddings/stella_400m_occupations_embs.pkl")
+        catalog.isco_code(0)  # i.e. '0110'
+        catalog.embeddings[0]
+        catalog.text(0)["title"]
+    """
+
+    def __init__(self, path: str, embeddings_path: Optional[str] = None) -> None:
+        """
+        Open the catalog at the given path.
+
+        Args:
+            path (str): The catalog directory.
+            embeddings_path (str): Optional path to the embeddings file to verify the catalog against.
+                The file is only hashed if its size or modification time changed since compiling.
+        """
+        path = Path(path)
+        with open(path / MANIFEST_FILE, "r") as f:
+            self.manifest = json.load(f)
+
+        assert self.manifest["version"] == CATALOG_VERSION, (
+            f"Unsupported catalog version {self.manifest['version']}, recompile the catalog"
+        )
+        if embeddings_path is not None:
+            assert (
+                file_fingerprint(embeddings_path) == self.manifest["embeddings_fingerprint"]
+                or file_checksum(embeddings_path) == self.manifest["embeddings_sha256"]
+            ), f"Catalog at {path} was not compiled against {embeddings_path}, recompile the catalog"
+
+        self.esco_codes = np.load(path / ESCO_CODES_FILE, mmap_mode="r")
+        self.esco_to_isco = np.load(path / ESCO_TO_ISCO_FILE, mmap_mode="r")
+        self.text_offsets = np.load(path / TEXT_OFFSETS_FILE, mmap_mode="r")
+        self.embeddings = np.load(path / EMBEDDINGS_FILE, mmap_mode="r")
+        self.text_blob = np.memmap(path / TEXT_FILE, dtype=np.uint8, mode="r") if self.text_offsets[-1] > 0 else b""
+
+    def __len__(self) -> int:
+        return len(self.esco_codes)
+
+    def esco_code(self, ix: int) -> str:
+        """
+        Get the ESCO code of the given row, i.e. 2422.12.4
+        """
+        return self.esco_codes[ix].decode("utf-8")
+
+    def isco_code(self, ix: int) -> str:
+        """
+        Get the ISCO code of the given row, i.e. 2422
+        """
+        return f"{self.esco_to_isco[ix]:04d}"
+
+    def isco_codes(self) -> pd.Series:
+        """
+        Get the ISCO codes of all rows, in the same form as returned by `load_occupations`.
+        """
+        return pd.Series(np.char.zfill(self.esco_to_isco.astype(str), 4))
+
+    def text(self, ix: int) -> Dict[str, Any]:
+        """
+        Get the text fields of the given row, decoded on access.
+
+        Args:
+            ix (int): The row index.
+
+        Returns:
+            Dict[str, Any]: The title, alternative labels, description and skills.
+        """
+        start, end = int(self.text_offsets[ix]), int(self.text_offsets[ix + 1])
+        return json.loads(bytes(self.text_blob[start:end]).decode("utf-8"))
+
+    def texts(self, ixs: List[int]) -> List[Dict[str, Any]]:
+        """
+        Get the text fields of the given rows.
+        """
+        return [self.text(ix) for ix in ixs]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the occupations JSON file into a binary catalog")
+    parser.add_argument("--occupations", type=str, required=True, help="Path to the occupations JSON file")
+    parser.add_argument("--embeddings", type=str, required=False, default="embeddings/stella_400m_occupations_embs.pkl", help="Occupations embeddings path")
+    parser.add_argument("--output", type=str, required=False, default="catalog/", help="Catalog output directory")
+    args = parser.parse_args()
+
+    compile_catalog(args.occupations, args.embeddings, args.output)
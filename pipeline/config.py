@@ -1,5 +1,6 @@
 import os
 
 LLAMA_MODEL_PATH = "mlx-community/Meta-Llama-3.1-8B-Instruct-8bit"
+DRAFT_MODEL_PATH = "mlx-community/Llama-3.2-1B-Instruct-8bit"
 OCCUPATIONS_EMBEDDINGS_PATH = "../embeddings/stella_400m_occupations_embs.pkl"
 EMBEDDING_MODEL_PATH = "dunzhang/stella_en_400M_v5"
@@ -0,0 +1,241 @@
+from typing import Any, List, Optional, Set
+
+import mlx.core as mx
+from mlx_lm import generate, stream_generate
+from mlx_lm.models.cache import make_prompt_cache, trim_prompt_cache
+
+NUM_DRAFT_TOKENS = 8
+MAX_NGRAM_SIZE = 3
+
+class DecodingStats:
+    """
+    Speculative decoding statistics, accumulated over all generate calls.
+
+    Example:
+        stats = DecodingStats()
+        generate_text(prompt, model, tokenizer, prompt_lookup=True, stats=stats)
+        print(stats.report())
+    """
+
+    def __init__(self) -> None:
+        self.generated = 0  # output tokens, including accepted draft tokens but not EOS
+        self.drafted = 0    # tokens proposed by the draft
+        self.accepted = 0   # draft tokens accepted by the main model, not counting EOS
+
+    def acceptance_rate(self) -> float:
+        """
+        Fraction of drafted tokens accepted by the main model.
+        """
+        return self.accepted / self.drafted if self.drafted else 0.0
+
+    def accepted_fraction(self) -> float:
+        """
+        Fraction of generated tokens that came from the draft.
+        """
+        return self.accepted / self.generated if self.generated else 0.0
+
+    def report(self) -> str:
+        return (
+            f"generated {self.generated} tokens, "
+            f"{self.accepted} ({self.accepted_fraction():.1%}) accepted from the draft, "
+            f"acceptance rate {self.acceptance_rate():.1%} of {self.drafted} drafted tokens"
+        )
+
+def encode_prompt(prompt: str, tokenizer: Any) -> List[int]:
+    """
+    Encode the prompt the same way `mlx_lm.generate` does, i.e. without a duplicated BOS token.
+    """
+    add_special_tokens = tokenizer.bos_token is None or not prompt.startswith(tokenizer.bos_token)
+    return tokenizer.encode(prompt, add_special_tokens=add_special_tokens)
+
+def lookup_draft(tokens: List[int], num_draft_tokens: int, max_ngram_size: int = MAX_NGRAM_SIZE) -> List[int]:
+    """
+    Draft the next tokens by finding the latest n-gram in an earlier part of the context.
+
+    The tokens following the most recent earlier match of the trailing n-gram are proposed,
+    trying the longest n-gram first. This works well when the output largely copies
+    the input, i.e. translating a job ad that keeps its structure and names.
+
+    Args:
+        tokens (List[int]): The prompt and generated tokens so far.
+        num_draft_tokens (int): Maximum number of tokens to draft.
+        max_ngram_size (int): Longest n-gram to match.
+
+    Returns:
+        List[int]: The drafted tokens, empty if no n-gram matched.
+    """
+    for ngram_size in range(min(max_ngram_size, len(tokens) - 1), 0, -1):
+        ngram = tokens[-ngram_size:]
+        for start in range(len(tokens) - ngram_size - 1, -1, -1):
+            if tokens[start:start + ngram_size] == ngram:
+                end = start + ngram_size
+                return tokens[end:end + num_draft_tokens]
+    return []
+
+def prompt_lookup_generate_tokens(
+    prompt_tokens: List[int],
+    model: Any,
+    eos_token_ids: Set[int],
+    max_tokens: int,
+    num_draft_tokens: int = NUM_DRAFT_TOKENS,
+    stats: Optional[DecodingStats] = None,
+) -> List[int]:
+    """
+    Greedy decoding with prompt lookup drafting.
+
+    Drafted tokens are verified by the main model in a single forward pass, and only the
+    prefix that matches the main model's greedy choice is kept, so the output is identical
+    to plain greedy decoding.
+
+    Args:
+        prompt_tokens (List[int]): The encoded prompt.
+        model (Any): The main model.
+        eos_token_ids (Set[int]): Tokens that end the generation.
+        max_tokens (int): Maximum number of tokens to generate.
+        num_draft_tokens (int): Maximum number of tokens to draft per step.
+        stats (DecodingStats): Optional statistics to accumulate into.
+
+    Returns:
+        List[int]: The generated tokens, ending with the EOS token if one was generated.
+    """
+    cache = make_prompt_cache(model)
+
+    logits = model(mx.array(prompt_tokens)[None], cache=cache)
+    tokens = [mx.argmax(logits[0, -1]).item()]
+
+    while len(tokens) < max_tokens and tokens[-1] not in eos_token_ids:
+        draft = lookup_draft(prompt_tokens + tokens, min(num_draft_tokens, max_tokens - len(tokens) - 1))
+
+        # the last token isn't in the cache yet, so it's verified along with the draft
+        logits = model(mx.array([tokens[-1]] + draft)[None], cache=cache)
+        preds = mx.argmax(logits[0], axis=-1).tolist()
+
+        n_accepted = 0
+        while n_accepted < len(draft) and draft[n_accepted] == preds[n_accepted]:
+            n_accepted += 1
+
+        # rejected draft tokens were written to the cache and have to be dropped
+        trim_prompt_cache(cache, len(draft) - n_accepted)
+
+        new_tokens = draft[:n_accepted] + [preds[n_accepted]]
+        for i, token in enumerate(new_tokens):
+            if token in eos_token_ids:
+                new_tokens = new_tokens[:i + 1]
+                n_accepted = min(n_accepted, i)
+                break
+        tokens.extend(new_tokens)
+
+        if stats is not None:
+            stats.drafted += len(draft)
+            stats.accepted += n_accepted
+
+    tokens = tokens[:max_tokens]
+    if stats is not None:
+        stats.generated += len([token for token in tokens if token not in eos_token_ids])
+
+    return tokens
+
+def prompt_lookup_generate(
+    prompt: str,
+    model: Any,
+    tokenizer: Any,
+    max_tokens: int,
+    num_draft_tokens: int = NUM_DRAFT_TOKENS,
+    stats: Optional[DecodingStats] = None,
+) -> str:
+    """
+    Generate text with prompt lookup drafting, see `prompt_lookup_generate_tokens`.
+
+    Returns:
+        str: The generated text.
+    """
+    eos_token_ids = set(tokenizer.eos_token_ids)
+    tokens = prompt_lookup_generate_tokens(
+        encode_prompt(prompt, tokenizer), model, eos_token_ids, max_tokens, num_draft_tokens, stats
+    )
+    return tokenizer.decode([token for token in tokens if token not in eos_token_ids])
+
+def draft_model_generate(
+    prompt: str,
+    model: Any,
+    tokenizer: Any,
+    max_tokens: int,
+    draft_model: Any,
+    num_draft_tokens: int = NUM_DRAFT_TOKENS,
+    stats: Optional[DecodingStats] = None,
+) -> str:
+    """
+    Greedy decoding with a small draft model, verified by the main model.
+
+    The draft model has to share the main model's tokenizer, i.e. Llama 3.2 1B for Llama 3.1 8B.
+
+    Returns:
+        str: The generated text.
+    """
+    text = ""
+    n_generated = 0
+    new_round = True
+    for response in stream_generate(
+        model,
+        tokenizer,
+        prompt,
+        max_tokens=max_tokens,
+        draft_model=draft_model,
+        num_draft_tokens=num_draft_tokens,
+    ):
+        text += response.text
+        # the final response repeats the last token when stopping on EOS, but carries
+        # the last token, not yielded before, when stopping on max_tokens
+        if response.finish_reason is not None and response.finish_reason != "length":
+            continue
+
+        # every verify round drafts up to num_draft_tokens, and ends on a token from the main model
+        if stats is not None:
+            if new_round:
+                stats.drafted += min(num_draft_tokens, max_tokens - n_generated)
+            stats.generated += 1
+            stats.accepted += int(response.from_draft)
+        n_generated += 1
+        new_round = not response.from_draft
+    return text
+
+def generate_text(
+    prompt: str,
+    model: Any,
+    tokenizer: Any,
+    max_tokens: int,
+    draft_model: Any = None,
+    prompt_lookup: bool = False,
+    num_draft_tokens: int = NUM_DRAFT_TOKENS,
+    stats: Optional[DecodingStats] = None,
+) -> str:
+    """
+    Generate text from the prompt, optionally with speculative decoding.
+
+    Args:
+        prompt (str): The formatted prompt.
+        model (Any): The main model.
+        tokenizer (Any): The main model's tokenizer.
+        max_tokens (int): Maximum number of tokens to generate.
+        draft_model (Any): Optional small draft model.
+        prompt_lookup (bool): Draft by copying n-grams from the prompt instead.
+        num_draft_tokens (int): Maximum number of tokens to draft per step.
+        stats (DecodingStats): Optional statistics to accumulate into.
+
+    Returns:
+        str: The generated text.
+    """
+    assert draft_model is None or not prompt_lookup, "Use either a draft model or prompt lookup, not both"
+
+    if draft_model is not None:
+        return draft_model_generate(prompt, model, tokenizer, max_tokens, draft_model, num_draft_tokens, stats)
+
+    if prompt_lookup:
+        return prompt_lookup_generate(prompt, model, tokenizer, max_tokens, num_draft_tokens, stats)
+
+    return generate(
+        model=model,
+        tokenizer=tokenizer,
+        prompt=prompt,
+        max_tokens=max_tokens,
+    )
@@ -1,3 +1,4 @@
+from functools import lru_cache
 import pickle
 from typing import List, Tuple
 
@@ -27,6 +28,21 @@ def set_query_text(job_title: str, job_description: str, job_skills: List[str])
         f"job skills: {', '.join(job_skills)}"
     ).lower()
 
+def set_raw_query_text(title_n_description: str) -> str:
+    """
+    Set the query text for job matching directly from the raw job ad, without LLM parsing.
+
+    Args:
+        title_n_description (str): The job title and description, separated by '; '.
+
+    Returns:
+        str: A formatted, lowercase string containing the job ad for querying.
+    """
+    return (
+        "We are looking for the closest job occupation category that matches the following data; "
+        f"job ad: {title_n_description}"
+    ).lower()
+
 def prepare_queries(parsed_job_ads: List[dict]) -> Tuple[List[str], List[str]]:
     """
     Prepare query texts for job matching based on parsed job advertisements.
@@ -65,14 +81,21 @@ def set_reference_text(job_titles: List[str], job_description: str, job_skills:
         f"job skills: {', '.join(job_skills)};"
     ).lower()
 
-def nn(query_texts: List[str], occupations_embs: np.ndarray) -> np.ndarray:
-    model = SentenceTransformer(
+@lru_cache(maxsize=1)
+def load_embedding_model() -> SentenceTransformer:
+    """
+    Load the embedding model once, so that repeated retrieval passes share it.
+    """
+    return SentenceTransformer(
         EMBEDDING_MODEL_PATH,
         trust_remote_code=True,
         device="cpu",
         config_kwargs={"use_memory_efficient_attention": False, "unpad_inputs": False}
     )
 
+def nn(query_texts: List[str], occupations_embs: np.ndarray) -> np.ndarray:
+    model = load_embedding_model()
+
     query_embeddings = model.encode(query_texts, prompt_name=QUERY_PROMPT_NAME)
 
     return model.similarity(query_embeddings, occupations_embs).numpy()
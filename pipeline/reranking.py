@@ -1,10 +1,40 @@
 from collections import Counter
-from typing import List, Dict
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 
 TOP_K = 5
+MIN_VOTES = 4  # rule 1: clear majority winner in the top-k
+TOP_VOTES = 3  # rule 2: nearest neighbour agrees with at least this many in the top-k
+CASCADE_TOP_VOTES = None  # the cascade only skips the LLM on a clear majority by default
+
+def vote(codes: List[str], min_votes: int = MIN_VOTES, top_votes: Optional[int] = TOP_VOTES) -> Tuple[str, bool]:
+    """
+    Vote on the ISCO code of the top-k nearest occupations.
+
+    Args:
+        codes (List[str]): The ISCO codes of the top-k occupations, ordered by ascending similarity.
+        min_votes (int): Votes needed for a prediction to be confident on its own.
+        top_votes (int): Votes needed for a prediction to be confident when it's also the nearest neighbour,
+            None disables this rule.
+
+    Returns:
+        Tuple[str, bool]: The most common code, and whether the vote is confident.
+    """
+    c = Counter(codes)
+
+    # rule 1: clear majority winner - if >=4 in top-5, then that is our prediction
+    # rule 2: if top code AND >= 3 in top-5, then that is our prediction
+    # all else are given to LLM to predict
+    top_pred = c.most_common(n=1)[0]
+    if top_pred[1] >= min_votes:
+        return (top_pred[0], True)
+
+    if top_votes is not None and top_pred[1] >= top_votes and codes[-1] == top_pred[0]:
+        return (top_pred[0], True)
+
+    return (top_pred[0], False)
 
 def naive_rerank(sims: np.ndarray, isco_codes: pd.Series, job_ad_ids: List[int]) -> Dict[int, str]:
     nearest_topk_ixs = np.argsort(sims, axis=1)[:, -TOP_K:]
@@ -14,25 +44,48 @@ def naive_rerank(sims: np.ndarray, isco_codes: pd.Series, job_ad_ids: List[int])
 
     for i, topk_ixs in enumerate(nearest_topk_ixs):
         codes = [isco_codes[topk_ix] for topk_ix in topk_ixs]
-        c = Counter(codes)
-
-        # rule 1: clear majority winner - if >=4 in top-5, then that is our prediction
-        # rule 2: if top code AND >= 3 in top-5, then that is our prediction
-        # all else are given to LLM to predict
-        top_pred = c.most_common(n=1)[0]
-        if top_pred[1] > 3:
-            pred_codes[job_ad_ids[i]] = top_pred[0]
-            continue
-
-        if top_pred[1] == 3 and codes[-1] == top_pred[0]:
-            pred_codes[job_ad_ids[i]] = top_pred[0]
-            continue
-
-        pred_codes[job_ad_ids[i]] = top_pred[0]
+        pred_codes[job_ad_ids[i]], _ = vote(codes)
         #job_ad_ids_for_llm_ranking[job_ad_ids[i]] = (query_texts[i], [esco_codes[topk_ix] for topk_ix in topk_ixs])
     
     return pred_codes
 
+def cascade_rerank(
+    sims: np.ndarray,
+    isco_codes: pd.Series,
+    job_ad_ids: List[int],
+    min_votes: int = MIN_VOTES,
+    top_votes: Optional[int] = CASCADE_TOP_VOTES,
+) -> Tuple[Dict[int, str], List[int]]:
+    """
+    Split the job ads into confident predictions and ads that need the full LLM pipeline.
+
+    Args:
+        sims (np.ndarray): Similarities between the job ads and the occupations.
+        isco_codes (pd.Series): The ISCO code of each occupation.
+        job_ad_ids (List[int]): The job ad ids, in the same order as `sims`.
+        min_votes (int): Votes needed for a prediction to be confident on its own.
+        top_votes (int): Votes needed for a prediction to be confident when it's also the nearest neighbour,
+            None (the default) only counts a clear majority as confident.
+
+    Returns:
+        Tuple[Dict[int, str], List[int]]: Mapping of confident job ad ids to predicted ISCO codes,
+        and the ids of the remaining job ads.
+    """
+    nearest_topk_ixs = np.argsort(sims, axis=1)[:, -TOP_K:]
+
+    pred_codes = {}
+    uncertain_job_ad_ids = []
+
+    for i, topk_ixs in enumerate(nearest_topk_ixs):
+        codes = [isco_codes[topk_ix] for topk_ix in topk_ixs]
+        code, confident = vote(codes, min_votes=min_votes, top_votes=top_votes)
+        if confident:
+            pred_codes[job_ad_ids[i]] = code
+        else:
+            uncertain_job_ad_ids.append(job_ad_ids[i])
+
+    return (pred_codes, uncertain_job_ad_ids)
+
 system_prompt = """
 **Instructions for Job Classification Using Chain-of-Thought Reasoning**
 
@@ -4,17 +4,19 @@ import json
 import logging
 from pathlib import Path
 import pickle
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from mlx_lm import load
 import numpy as np
 import pandas as pd
 
 from base import check_system_requirements
-from config import LLAMA_MODEL_PATH
+from catalog import OccupationCatalog
+from config import DRAFT_MODEL_PATH, LLAMA_MODEL_PATH
 from data import load_job_ads, load_occupations
-from nn import nn, prepare_queries
-from reranking import naive_rerank
+from generation import DecodingStats
+from nn import nn, prepare_queries, set_raw_query_text
+from reranking import CASCADE_TOP_VOTES, MIN_VOTES, cascade_rerank, naive_rerank
 from skills_extraction import get_parsed_job_dict, parse_job_ad
 from translation import translate_to_english
 
@@ -25,9 +27,17 @@ logging.basicConfig(level=logging.INFO)
 
 model, tokenizer = load(LLAMA_MODEL_PATH)
 
-def translation_pipeline(job_ads_path: str, output_dir: str) -> None:
+DEFAULT_OCCUPATIONS_EMBEDDINGS_PATH = "embeddings/stella_400m_occupations_embs.pkl"
+
+# speculative decoding options for all generate calls, set from the command line
+generation_kwargs: Dict[str, Any] = {}
+decoding_stats = DecodingStats()
+
+def translation_pipeline(job_ads_path: str, output_dir: str, job_ad_ids: Optional[List[int]] = None) -> None:
     """
     Translate the job ads to English. Output the results to a CSV file.
+
+    If `job_ad_ids` is given, only those job ads are translated.
     """
     output_path = Path(output_dir)
     output_path.mkdir(exist_ok=True)
@@ -37,8 +47,10 @@ def translation_pipeline(job_ads_path: str, output_dir: str) -> None:
     logger.info(f"Translating job ads to English and saving to {output_path}")
 
     df = load_job_ads(job_ads_path)
+    if job_ad_ids is not None:
+        df = df[df["id"].isin(job_ad_ids)].copy()
     df["title_n_description"] = df[["title", "description"]].agg("; ".join, axis=1)
-    df["title_n_description_en"] = df["title_n_description"].apply(translate_to_english, model=model, tokenizer=tokenizer)
+    df["title_n_description_en"] = df["title_n_description"].apply(translate_to_english, model=model, tokenizer=tokenizer, **generation_kwargs)
 
     pd.DataFrame([
         pd.Series(df["id"], name="id").astype(int),
@@ -61,7 +73,7 @@ def parsing_pipeline(output_dir: str) -> None:
     logger.info(f"Parsing job ads and saving to {output_path}")
 
     for ix, row in df.iterrows():
-        parsed_job_ad = parse_job_ad(row["title_and_description"], model=model, tokenizer=tokenizer)
+        parsed_job_ad = parse_job_ad(row["title_and_description"], model=model, tokenizer=tokenizer, **generation_kwargs)
         parsed_dict = get_parsed_job_dict(parsed_job_ad)
         parsed_dict["id"] = row["id"]
         parsed_job_dicts.append(parsed_dict)
@@ -69,7 +81,7 @@ def parsing_pipeline(output_dir: str) -> None:
     with open(output_path, "w") as f:
         json.dump(parsed_job_dicts, f)
 
-def nn_pipeline(occupations_embs_path: str, output_dir: str) -> Tuple[List[int], np.ndarray]:
+def nn_pipeline(occupations_embs: np.ndarray, output_dir: str) -> Tuple[List[int], np.ndarray]:
     """
     Run the nearest neighbor pipeline. Output the results to a CSV file.
     """
@@ -81,38 +93,126 @@ def nn_pipeline(occupations_embs_path: str, output_dir: str) -> Tuple[List[int],
 
     logger.info("Starting Nearest Neighbor pipeline")
 
-    with open(occupations_embs_path, "rb") as f:
-        occupations_embs = pickle.load(f)
-
     return (job_ad_ids, nn(query_texts, occupations_embs))
 
+def load_occupations_embs(occupations_embs_path: str) -> np.ndarray:
+    """
+    Load the occupations embeddings from the given path.
+    """
+    with open(occupations_embs_path, "rb") as f:
+        return pickle.load(f)
+
 def reranking_pipeline(sims: np.ndarray, job_ad_ids: List[int], isco_codes: pd.Series) -> Dict[int, str]:
     """
     Run the reranking pipeline. Output mapping job ids to predicted ISCO codes.
     """
     logger.info("Starting Re-Ranking pipeline")
     return naive_rerank(sims, isco_codes, job_ad_ids)
-    
 
+def cascade_pipeline(
+    job_ads_path: str,
+    occupations_embs: np.ndarray,
+    output_dir: str,
+    isco_codes: pd.Series,
+    min_votes: int = MIN_VOTES,
+    top_votes: Optional[int] = CASCADE_TOP_VOTES,
+) -> Dict[int, str]:
+    """
+    Run the embedding-first cascade. Output mapping job ids to predicted ISCO codes.
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--data", type=str, required=True, help="Path to the job ads CSV file")
-    parser.add_argument("--occupations", type=str, required=True, help="Path to the occupations JSON file")
-    parser.add_argument("--output", type=str, required=False, default="output/", help="Output directory")
-    parser.add_argument("--embeddings", type=str, required=False, default="embeddings/stella_400m_occupations_embs.pkl", help="Occupations embeddings path")
-    args = parser.parse_args()
+    The raw job ads are embedded directly and reranked; ads with a confident vote are
+    predicted right away, and only the rest go through translation, parsing and a second
+    nearest neighbor pass. A report of the fraction of ads that skipped the LLM is written
+    to the output directory.
+    """
+    logger.info("Starting cascade pipeline")
+
+    df = load_job_ads(job_ads_path)
+    query_texts = df[["title", "description"]].agg("; ".join, axis=1).apply(set_raw_query_text).tolist()
+    job_ad_ids = df["id"].tolist()
+
+    sims = nn(query_texts, occupations_embs)
+    predictions, uncertain_job_ad_ids = cascade_rerank(
+        sims, isco_codes, job_ad_ids, min_votes=min_votes, top_votes=top_votes
+    )
+
+    n_skipped = len(predictions)
+    logger.info(f"{n_skipped} of {len(job_ad_ids)} job ads predicted without the LLM")
 
-    translation_pipeline(args.data, args.output)
+    if uncertain_job_ad_ids:
+        translation_pipeline(job_ads_path, output_dir, job_ad_ids=uncertain_job_ad_ids)
+        parsing_pipeline(output_dir)
+        llm_job_ad_ids, llm_sims = nn_pipeline(occupations_embs, output_dir)
+        predictions.update(reranking_pipeline(llm_sims, llm_job_ad_ids, isco_codes))
 
-    parsing_pipeline(args.output)
+    report_path = Path(output_dir) / "cascade_report.json"
+    logger.info(f"Storing cascade report to {report_path}")
+    with open(report_path, "w") as f:
+        json.dump({
+            "min_votes": min_votes,
+            "top_votes": top_votes,
+            "n_job_ads": len(job_ad_ids),
+            "n_skipped_llm": n_skipped,
+            "skipped_llm_fraction": n_skipped / len(job_ad_ids) if job_ad_ids else 0.0,
+        }, f, indent=4)
 
-    esco_codes, isco_codes, occupation_dict = load_occupations(args.occupations)
+    return predictions
 
-    job_ad_ids, sims = nn_pipeline(args.embeddings, args.output)
 
-    predictions = reranking_pipeline(sims, job_ad_ids, isco_codes)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", type=str, required=True, help="Path to the job ads CSV file")
+    parser.add_argument("--occupations", type=str, required=False, help="Path to the occupations JSON file")
+    parser.add_argument("--output", type=str, required=False, default="output/", help="Output directory")
+    parser.add_argument("--embeddings", type=str, required=False, default=None, help="Occupations embeddings path, verified against the catalog if used with --catalog")
+    parser.add_argument("--catalog", type=str, required=False, default=None, help="Compiled occupations catalog directory, used instead of the occupations JSON file")
+    parser.add_argument("--cascade", action="store_true", help="Only run the LLM on job ads the embedding vote isn't confident about")
+    parser.add_argument("--cascade-min-votes", type=int, required=False, default=MIN_VOTES, help="Top-k votes for a confident cascade prediction")
+    parser.add_argument("--cascade-top-votes", type=int, required=False, default=CASCADE_TOP_VOTES, help="Also count a cascade prediction as confident with this many top-k votes if it is the nearest neighbour (off by default)")
+    parser.add_argument("--draft-model", type=str, nargs="?", const=DRAFT_MODEL_PATH, default=None, help="Speculative decoding with a small draft model, defaults to the configured draft model")
+    parser.add_argument("--prompt-lookup", action="store_true", help="Speculative decoding by copying n-grams from the job ad")
+    args = parser.parse_args()
+    if not args.occupations and not args.catalog:
+        parser.error("one of --occupations or --catalog is required")
+    if args.draft_model and args.prompt_lookup:
+        parser.error("--draft-model and --prompt-lookup can't be used together")
+
+    if args.draft_model:
+        draft_model, _ = load(args.draft_model)
+        generation_kwargs.update(draft_model=draft_model, stats=decoding_stats)
+    elif args.prompt_lookup:
+        generation_kwargs.update(prompt_lookup=True, stats=decoding_stats)
+
+    if args.catalog:
+        catalog = OccupationCatalog(args.catalog, embeddings_path=args.embeddings)
+        isco_codes = catalog.isco_codes()
+        occupations_embs = catalog.embeddings
+    else:
+        esco_codes, isco_codes, occupation_dict = load_occupations(args.occupations)
+        occupations_embs = load_occupations_embs(args.embeddings or DEFAULT_OCCUPATIONS_EMBEDDINGS_PATH)
+
+    if args.cascade:
+        Path(args.output).mkdir(exist_ok=True)
+        predictions = cascade_pipeline(
+            args.data,
+            occupations_embs,
+            args.output,
+            isco_codes,
+            min_votes=args.cascade_min_votes,
+            top_votes=args.cascade_top_votes,
+        )
+    else:
+        translation_pipeline(args.data, args.output)
+
+        parsing_pipeline(args.output)
+
+        job_ad_ids, sims = nn_pipeline(occupations_embs, args.output)
+
+        predictions = reranking_pipeline(sims, job_ad_ids, isco_codes)
     
+    if generation_kwargs:
+        logger.info(f"Speculative decoding: {decoding_stats.report()}")
+
     # output predictions to CSV
     predictions_path = Path(args.output) / "predictions.csv"
     logger.info(f"Storing predictions to {predictions_path}")
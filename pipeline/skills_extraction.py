@@ -1,8 +1,7 @@
 from typing import Any, Dict, List
 
-from mlx_lm import generate
-
 from base import set_llama_prompt
+from generation import generate_text
 
 def get_job_description(s: str) -> str:
     """
@@ -60,12 +59,13 @@ def get_parsed_job_dict(parsed_job_ad: str) -> Dict[str, Any]:
             parsed_job_dict["skills"] = get_job_skills(line)
     return parsed_job_dict
 
-def parse_job_ad(job_ad: str, model: Any, tokenizer: Any) -> str:
+def parse_job_ad(job_ad: str, model: Any, tokenizer: Any, **generation_kwargs: Any) -> str:
     """
     Parse the job ad and extract the job title, job description, and job skills.
 
     Args:
         job_ad (str): The job ad.
+        generation_kwargs: Speculative decoding options, passed on to `generate_text`.
 
     Returns:
         str: The parsed job ad.
@@ -99,9 +99,10 @@ def parse_job_ad(job_ad: str, model: Any, tokenizer: Any) -> str:
     )
     skills_extraction_prompt = set_llama_prompt(system_prompt, job_ad)
 
-    return generate(
+    return generate_text(
         model=model,
         tokenizer=tokenizer,
         prompt=skills_extraction_prompt,
         max_tokens=4096,
+        **generation_kwargs,
     )
@@ -1,16 +1,17 @@
 from typing import Any
 
 from langdetect import detect
-from mlx_lm import generate
 
 from base import set_llama_prompt
+from generation import generate_text
 
-def translate_to_english(text: str, model: Any, tokenizer: Any, max_tokens: int = 512) -> str:
+def translate_to_english(text: str, model: Any, tokenizer: Any, max_tokens: int = 512, **generation_kwargs: Any) -> str:
     """
     Translate the given text to English.
 
     Args:
         text (str): The text to translate.
+        generation_kwargs: Speculative decoding options, passed on to `generate_text`.
 
     Returns:
         str: The translated text.
@@ -29,9 +30,10 @@ def translate_to_english(text: str, model: Any, tokenizer: Any, max_tokens: int
     )
     translation_prompt = set_llama_prompt(system_prompt, text)
 
-    return generate(
+    return generate_text(
         model=model,
         tokenizer=tokenizer,
         prompt=translation_prompt,
         max_tokens=max_tokens,
+        **generation_kwargs,
     )
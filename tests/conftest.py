@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# the pipeline and data scripts import their siblings as top-level modules
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "pipeline"))
+sys.path.insert(0, str(ROOT / "data"))
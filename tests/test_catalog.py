@@ -0,0 +1,91 @@
+import json
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from catalog import OccupationCatalog, compile_catalog, get_occupation_text
+from data import load_occupations
+
+OCCUPATIONS = {
+    "2422": {
+        "title": "Policy administration professionals",
+        "description": "Policy administration professionals develop and analyse policies.",
+        "languages": {"en": {"preferredLabel": "Policy administration professionals"}},
+        "is_leaf": False,
+    },
+    "2422.12.4": {
+        "title": "legal policy officer",
+        "description": "Legal policy officers research, analyse and develop policies.",
+        "languages": {"en": {"preferredLabel": "legal policy officer", "alternativeLabel": ["legal policy advisor"]}},
+        "hasEssentialSkill": ["advise on legal decisions"],
+        "hasOptionalSkill": ["manage government policy implementation"],
+        "is_leaf": True,
+    },
+    "0110": {
+        "title": "Commissioned armed forces officers",
+        "description": "Commissioned armed forces officers provide leadership to units in the armed forces.",
+        "languages": {"en": {"preferredLabel": "Commissioned armed forces officers"}},
+        "is_leaf": True,
+    },
+    "0110.1": {
+        "title": "officier de l'armée",
+        "languages": {"fr": {"preferredLabel": "officier de l'armée"}},
+        "is_leaf": True,
+    },
+}
+
+
+@pytest.fixture
+def compiled(tmp_path):
+    occupations_path = tmp_path / "occupations_data.json"
+    with open(occupations_path, "w") as f:
+        json.dump(OCCUPATIONS, f)
+
+    # load_occupations skips non-leaf ISCO groups, so there is one row less than entries
+    embeddings = np.arange(3 * 4, dtype=np.float32).reshape(3, 4)
+    embeddings_path = tmp_path / "embs.pkl"
+    with open(embeddings_path, "wb") as f:
+        pickle.dump(embeddings, f)
+
+    compile_catalog(str(occupations_path), str(embeddings_path), str(tmp_path / "catalog"))
+    return (occupations_path, embeddings_path, embeddings, tmp_path / "catalog")
+
+
+def test_catalog_round_trip(compiled):
+    occupations_path, embeddings_path, embeddings, catalog_path = compiled
+    esco_codes, isco_codes, occupation_dict = load_occupations(str(occupations_path))
+
+    catalog = OccupationCatalog(str(catalog_path), embeddings_path=str(embeddings_path))
+
+    assert len(catalog) == len(esco_codes)
+    assert catalog.isco_codes().equals(isco_codes)
+    np.testing.assert_array_equal(catalog.embeddings, embeddings)
+    for ix, esco_code in enumerate(esco_codes):
+        assert catalog.esco_code(ix) == esco_code
+        assert catalog.isco_code(ix) == isco_codes[ix]
+        assert catalog.text(ix) == get_occupation_text(occupation_dict[esco_code])
+
+    assert np.issubdtype(catalog.esco_to_isco.dtype, np.integer)
+    assert catalog.esco_to_isco.tolist() == [2422, 110, 110]
+
+    assert catalog.text(0)["alternative_labels"] == ["legal policy advisor"]
+    assert catalog.text(0)["skills"] == ["advise on legal decisions", "manage government policy implementation"]
+
+
+def test_catalog_accepts_touched_embeddings_with_same_content(compiled):
+    _, embeddings_path, _, catalog_path = compiled
+    stat = os.stat(embeddings_path)
+    os.utime(embeddings_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    OccupationCatalog(str(catalog_path), embeddings_path=str(embeddings_path))
+
+
+def test_catalog_rejects_different_embeddings(compiled):
+    _, embeddings_path, embeddings, catalog_path = compiled
+    with open(embeddings_path, "wb") as f:
+        pickle.dump(embeddings + 1, f)
+
+    with pytest.raises(AssertionError):
+        OccupationCatalog(str(catalog_path), embeddings_path=str(embeddings_path))
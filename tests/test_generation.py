@@ -0,0 +1,145 @@
+from types import SimpleNamespace
+
+import pytest
+
+mx = pytest.importorskip("mlx.core")
+
+import generation
+from generation import DecodingStats, draft_model_generate, lookup_draft, prompt_lookup_generate_tokens
+from mlx_lm.generate import generate_step
+from mlx_lm.models import llama
+from mlx_lm.models.cache import KVCache
+
+VOCAB_SIZE = 16
+
+
+class PositionalBigramModel:
+    """
+    A tiny stand-in model whose greedy next token depends on the current token and its position.
+
+    The position is read from the KV cache, so decoding with a wrongly trimmed cache changes the output.
+    """
+
+    def __init__(self, table, overrides=None):
+        self.table = table
+        self.overrides = overrides or {}  # position -> forced next token
+
+    def make_cache(self):
+        return [KVCache()]
+
+    def __call__(self, inputs, cache):
+        offset = cache[0].offset
+        kv = mx.zeros((1, 1, inputs.shape[1], 1))
+        cache[0].update_and_fetch(kv, kv)
+
+        next_tokens = [
+            self.overrides.get(offset + i, self.table[token]) for i, token in enumerate(inputs[0].tolist())
+        ]
+        return (mx.arange(VOCAB_SIZE)[None] == mx.array(next_tokens)[:, None]).astype(mx.float32)[None]
+
+
+def greedy_tokens(model, prompt_tokens, eos_token_ids, max_tokens):
+    tokens = []
+    for token, _ in generate_step(mx.array(prompt_tokens), model, max_tokens=max_tokens):
+        tokens.append(token if isinstance(token, int) else token.item())
+        if tokens[-1] in eos_token_ids:
+            break
+    return tokens
+
+
+CYCLE = {token: (token % 5) + 1 for token in range(VOCAB_SIZE)}  # 1 -> 2 -> 3 -> 4 -> 5 -> 1
+
+
+def test_lookup_draft():
+    assert lookup_draft([1, 2, 3, 4, 5, 9, 2, 3], 3) == [4, 5, 9]
+    assert lookup_draft([1, 2, 1, 2], 8) == [1, 2]
+    assert lookup_draft([1, 2, 3], 3) == []
+    assert lookup_draft([7], 3) == []
+    # the longest matching n-gram wins over a more recent shorter match
+    assert lookup_draft([1, 2, 3, 9, 5, 3, 8, 2, 3], 1) == [9]
+
+
+@pytest.mark.parametrize("overrides", [{}, {9: 7, 14: 1}])
+def test_prompt_lookup_matches_greedy(overrides):
+    model = PositionalBigramModel(CYCLE, overrides)
+    prompt_tokens = [1, 2, 3, 4, 5, 1, 2]
+    stats = DecodingStats()
+
+    tokens = prompt_lookup_generate_tokens(prompt_tokens, model, set(), max_tokens=20, num_draft_tokens=4, stats=stats)
+
+    assert tokens == greedy_tokens(model, prompt_tokens, set(), max_tokens=20)
+    assert stats.generated == 20
+    assert 0 < stats.accepted <= stats.drafted
+
+
+def test_prompt_lookup_stops_on_eos_inside_accepted_draft():
+    model = PositionalBigramModel(CYCLE)
+    prompt_tokens = [1, 2, 3, 4, 5, 1, 2]
+    stats = DecodingStats()
+
+    # greedy output is 3, then the draft 4, 5, 1, ... is accepted up to the EOS token 5
+    tokens = prompt_lookup_generate_tokens(prompt_tokens, model, {5}, max_tokens=20, num_draft_tokens=4, stats=stats)
+
+    assert tokens == [3, 4, 5]
+    assert tokens == greedy_tokens(model, prompt_tokens, {5}, max_tokens=20)
+    # EOS is not counted as a generated or accepted token, as in draft model mode
+    assert (stats.generated, stats.drafted, stats.accepted) == (2, 4, 1)
+
+
+@pytest.mark.parametrize("max_tokens", [1, 2, 3])
+def test_prompt_lookup_respects_max_tokens(max_tokens):
+    model = PositionalBigramModel(CYCLE)
+    prompt_tokens = [1, 2, 3, 4, 5, 1, 2]
+
+    # with max_tokens=2 the second step has no room for draft tokens
+    tokens = prompt_lookup_generate_tokens(prompt_tokens, model, set(), max_tokens=max_tokens, num_draft_tokens=4)
+
+    assert tokens == greedy_tokens(model, prompt_tokens, set(), max_tokens=max_tokens)
+    assert len(tokens) == max_tokens
+
+
+def test_prompt_lookup_matches_greedy_with_transformer():
+    mx.random.seed(0)
+    model = llama.Model(llama.ModelArgs(
+        model_type="llama",
+        hidden_size=32,
+        num_hidden_layers=2,
+        intermediate_size=64,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        rms_norm_eps=1e-5,
+        vocab_size=VOCAB_SIZE,
+    ))
+    prompt_tokens = [3, 1, 4, 1, 5, 9, 2, 6, 3, 1, 4, 1, 5, 9, 2, 6]
+
+    tokens = prompt_lookup_generate_tokens(prompt_tokens, model, set(), max_tokens=32, num_draft_tokens=4)
+
+    assert tokens == greedy_tokens(model, prompt_tokens, set(), max_tokens=32)
+
+
+def test_draft_model_stats(monkeypatch):
+    # two verify rounds of 4 drafted tokens: 2 accepted, then all 4 accepted, and the final response
+    from_draft = [True, True, False, True, True, True, True, False]
+    responses = [SimpleNamespace(text="a", from_draft=d, finish_reason=None) for d in from_draft]
+    responses.append(SimpleNamespace(text="!", from_draft=False, finish_reason="stop"))
+    monkeypatch.setattr(generation, "stream_generate", lambda *args, **kwargs: iter(responses))
+    stats = DecodingStats()
+
+    text = draft_model_generate("prompt", None, None, max_tokens=100, draft_model=None, num_draft_tokens=4, stats=stats)
+
+    assert text == "a" * 8 + "!"
+    assert (stats.generated, stats.drafted, stats.accepted) == (8, 8, 6)
+    assert stats.acceptance_rate() == 0.75
+
+
+def test_draft_model_stats_count_last_token_on_max_tokens(monkeypatch):
+    # the max_tokens-th token only comes with the final response
+    responses = [SimpleNamespace(text="a", from_draft=True, finish_reason=None) for _ in range(3)]
+    responses.append(SimpleNamespace(text="b", from_draft=True, finish_reason="length"))
+    monkeypatch.setattr(generation, "stream_generate", lambda *args, **kwargs: iter(responses))
+    stats = DecodingStats()
+
+    text = draft_model_generate("prompt", None, None, max_tokens=4, draft_model=None, num_draft_tokens=4, stats=stats)
+
+    assert text == "aaab"
+    assert (stats.generated, stats.drafted, stats.accepted) == (4, 4, 4)
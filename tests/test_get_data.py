@@ -0,0 +1,188 @@
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+from pathlib import Path
+import signal
+from threading import Thread, Timer
+from time import monotonic
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from get_data import get_retry_delay, scrape
+
+RESPONSES_PATH = Path(__file__).parent / "data" / "esco_responses.json"
+
+ISCO_URI = "http://data.europa.eu/esco/isco/C2422"
+ESCO_URI = "http://data.europa.eu/esco/occupation/legal-policy-officer"
+TO_SCRAPE = [("2422", ISCO_URI), ("2422.12.4", ESCO_URI)]
+
+
+class RecordedESCOServer(ThreadingHTTPServer):
+    """
+    A local stand-in for the ESCO API, replaying recorded responses.
+
+    `failures` queues error statuses to send for a URI before its recorded response,
+    and every request is counted per URI.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), RecordedESCOHandler)
+        with open(RESPONSES_PATH, "r") as f:
+            self.responses = json.load(f)
+        self.failures = defaultdict(list)
+        self.requests = Counter()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class RecordedESCOHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        uri = parse_qs(urlparse(self.path).query)["uri"][0]
+        self.server.requests[uri] += 1
+
+        if self.server.failures[uri]:
+            status, headers = self.server.failures[uri].pop(0)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        etag = '"v1"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        body = json.dumps(self.server.responses[uri]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server():
+    server = RecordedESCOServer()
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def run_scrape(server: RecordedESCOServer, tmp_path: Path, refresh: bool = False):
+    return scrape(
+        TO_SCRAPE,
+        output_path=str(tmp_path / "occupations_data.jsonl"),
+        base_url=server.base_url,
+        cache_dir=str(tmp_path / "cache"),
+        workers=2,
+        rate=100,
+        refresh=refresh,
+        backoff=0,
+    )
+
+
+def test_scrape_writes_records(server, tmp_path):
+    occupation_dict, errors = run_scrape(server, tmp_path)
+
+    assert errors == []
+    assert list(occupation_dict) == ["2422", "2422.12.4"]
+    assert occupation_dict["2422.12.4"]["code"] == "2422.12.4"
+    assert occupation_dict["2422.12.4"]["hasEssentialSkill"] == ["advise on legal decisions", "compile legal documents"]
+    assert occupation_dict["2422.12.4"]["ancestors"] == {"Policy administration professionals": ISCO_URI}
+
+    with open(tmp_path / "occupations_data.jsonl", "r") as f:
+        lines = [json.loads(line) for line in f]
+    assert sorted(code for line in lines for code in line) == ["2422", "2422.12.4"]
+
+
+def test_scrape_retries_server_errors_and_rate_limiting(server, tmp_path):
+    server.failures[ESCO_URI] = [(503, {}), (429, {"Retry-After": "0"})]
+
+    occupation_dict, errors = run_scrape(server, tmp_path)
+
+    assert errors == []
+    assert occupation_dict["2422.12.4"]["title"] == "legal policy officer"
+    assert server.requests[ESCO_URI] == 3
+
+
+def test_scrape_does_not_retry_client_errors(server, tmp_path):
+    server.failures[ESCO_URI] = [(404, {})]
+
+    occupation_dict, errors = run_scrape(server, tmp_path)
+
+    assert errors == ["2422.12.4"]
+    assert list(occupation_dict) == ["2422"]
+    assert server.requests[ESCO_URI] == 1
+
+
+def test_scrape_with_warm_cache_makes_no_requests(server, tmp_path):
+    first_run, _ = run_scrape(server, tmp_path)
+    n_requests = sum(server.requests.values())
+
+    second_run, errors = run_scrape(server, tmp_path)
+
+    assert errors == []
+    assert second_run == first_run
+    assert sum(server.requests.values()) == n_requests
+
+
+def test_scrape_refresh_keeps_cached_body_when_not_modified(server, tmp_path):
+    first_run, _ = run_scrape(server, tmp_path)
+    # a changed body would show up if the 304 wasn't honoured
+    server.responses[ESCO_URI]["title"] = "changed"
+
+    second_run, errors = run_scrape(server, tmp_path, refresh=True)
+
+    assert errors == []
+    assert second_run == first_run
+    assert server.requests[ESCO_URI] == 2
+
+
+def test_get_retry_delay():
+    response = requests.Response()
+    response.headers["Retry-After"] = "7"
+    assert get_retry_delay(response, attempt=0, backoff=1.0) == 7.0
+
+    response.headers["Retry-After"] = "Wed, 21 Oct 2015 07:28:00 GMT"
+    assert get_retry_delay(response, attempt=2, backoff=1.0) == 4.0
+
+    assert get_retry_delay(None, attempt=1, backoff=0.5) == 1.0
+
+
+def test_scrape_stops_on_keyboard_interrupt(server, tmp_path):
+    uri = ESCO_URI
+    to_scrape = [(f"2422.12.{i}", f"{uri}-{i}") for i in range(20)]
+    for code, scraped_uri in to_scrape:
+        server.responses[scraped_uri] = server.responses[uri]
+
+    timer = Timer(1, os.kill, args=(os.getpid(), signal.SIGINT))
+    timer.start()
+    started_at = monotonic()
+    with pytest.raises(KeyboardInterrupt):
+        scrape(
+            to_scrape,
+            output_path=str(tmp_path / "occupations_data.jsonl"),
+            base_url=server.base_url,
+            cache_dir=str(tmp_path / "cache"),
+            workers=2,
+            rate=2,
+        )
+    timer.join()
+
+    assert monotonic() - started_at < 3
+    assert sum(server.requests.values()) <= 6
@@ -0,0 +1,63 @@
+from collections import Counter
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from reranking import TOP_K, cascade_rerank, naive_rerank, vote
+
+
+def reference_naive_rerank(sims, isco_codes, job_ad_ids):
+    # the vote rules as they were before they were factored into vote()
+    nearest_topk_ixs = np.argsort(sims, axis=1)[:, -TOP_K:]
+    pred_codes = {}
+    for i, topk_ixs in enumerate(nearest_topk_ixs):
+        codes = [isco_codes[topk_ix] for topk_ix in topk_ixs]
+        top_pred = Counter(codes).most_common(n=1)[0]
+        pred_codes[job_ad_ids[i]] = top_pred[0]
+    return pred_codes
+
+
+def reference_confident(codes):
+    top_pred = Counter(codes).most_common(n=1)[0]
+    return top_pred[1] > 3 or (top_pred[1] == 3 and codes[-1] == top_pred[0])
+
+
+def test_vote_matches_original_rules():
+    # every top-5 of three possible codes, ordered by ascending similarity
+    for codes in itertools.product("abc", repeat=TOP_K):
+        codes = list(codes)
+        code, confident = vote(codes)
+        assert code == Counter(codes).most_common(n=1)[0][0]
+        assert confident == reference_confident(codes)
+
+
+def test_vote_without_nearest_neighbour_rule():
+    assert vote(["b", "a", "c", "a", "a"], top_votes=None) == ("a", False)
+    assert vote(["b", "a", "a", "a", "a"], top_votes=None) == ("a", True)
+
+
+def test_naive_rerank_matches_reference():
+    rng = np.random.default_rng(0)
+    sims = rng.random((50, 12))
+    isco_codes = pd.Series(["1111", "1111", "1111", "2422", "2422", "2422", "2422", "0110", "0110", "3333", "3333", "3333"])
+    job_ad_ids = list(range(100, 150))
+
+    assert naive_rerank(sims, isco_codes, job_ad_ids) == reference_naive_rerank(sims, isco_codes, job_ad_ids)
+
+
+def test_cascade_rerank_splits_confident_ads():
+    isco_codes = pd.Series(["1111", "1111", "1111", "1111", "2422", "2422", "2422", "0110"])
+    sims = np.array([
+        [.9, .8, .7, .6, .1, .1, .1, .5],  # 4 of 5 agree
+        [.1, .2, .3, .4, .8, .6, .7, .9],  # 3 of 5 agree, but not with the nearest neighbour
+        [.1, .2, .3, .4, .8, .6, .7, .5],  # 3 of 5 agree with the nearest neighbour
+    ])
+
+    predictions, uncertain = cascade_rerank(sims, isco_codes, [1, 2, 3])
+    assert predictions == {1: "1111"}
+    assert uncertain == [2, 3]
+
+    predictions, uncertain = cascade_rerank(sims, isco_codes, [1, 2, 3], top_votes=3)
+    assert predictions == {1: "1111", 3: "2422"}
+    assert uncertain == [2]